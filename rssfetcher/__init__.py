@@ -7,6 +7,22 @@
 #   - requests
 # ----------
 
-from .server import app
+# the server stack (fastapi, uvicorn, ...) is imported on first access of `app`,
+# so the one-shot fetcher (`python -m rssfetcher`) does not pay for it.
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .server import app
 
 __all__ = ['app']
+
+def __getattr__(name: str) -> object:
+    if name == 'app':
+        from .server import app
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__() -> list[str]:
+    # `fastapi run rssfetcher` finds the app from `dir(module)`
+    return [*globals(), 'app']
@@ -5,18 +5,42 @@
 #
 # ----------
 
+import argparse
 import sys
 
 from .core import fetch_feeds, configure_logger, load_config_helper
+from .tracing import Tracer, set_tracer
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='rssfetcher', description='Fetch all feeds once.')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='write the timing of each stage into PATH as a json trace file.')
+    parser.add_argument('--profile', action='store_true',
+                        help='run under the profiler and print the hottest functions of each stage.')
+    return parser.parse_args(argv)
 
 def fetch_once(argv = sys.argv):
+    args = parse_args(argv[1:])
     configure_logger()
     conf = load_config_helper()
+
+    tracer = None
+    if args.trace or args.profile:
+        tracer = Tracer(profile=args.profile)
+        set_tracer(tracer)
+
     try:
         fetch_feeds(conf, list(conf.iter_feeds()))
     except KeyboardInterrupt:
         print('User cancel.')
         return 1
+    finally:
+        if tracer is not None:
+            set_tracer(None)
+            if args.trace:
+                tracer.export(args.trace)
+            if args.profile:
+                tracer.print_profile_stats()
 
 if __name__ == '__main__':
     exit(fetch_once() or 0)
@@ -5,8 +5,12 @@
 # 
 # ----------
 
+import os
 from hashlib import sha1
 
+# the env prefix of `settings.Settings`
+SETTINGS_ENV_PREFIX = 'RSSFETCHER_'
+
 
 def create_unique_id(content: str) -> str:
     '''
@@ -14,3 +18,17 @@ def create_unique_id(content: str) -> str:
     '''
     hashed = sha1(content.encode('utf-8', errors='ignore')).hexdigest()
     return f'sha1:{hashed}'
+
+
+def read_settings_env(field_name: str) -> str | None:
+    '''
+    Read the env var of a `settings.Settings` field without pydantic.
+
+    The name is case-insensitive like pydantic-settings, and the last matched one wins.
+    '''
+    env_name = (SETTINGS_ENV_PREFIX + field_name).lower()
+    value = None
+    for name, val in os.environ.items():
+        if name.lower() == env_name:
+            value = val
+    return value
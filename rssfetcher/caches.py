@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2025~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import json
+import threading
+from bisect import bisect_right
+from collections.abc import Iterable, Mapping, Sequence
+from typing import NamedTuple
+
+
+def encode_item(item: Mapping[str, object]) -> bytes:
+    '''
+    Encode an item as json, with the same format that the fastapi response use.
+    '''
+    return json.dumps(item, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode('utf-8')
+
+
+class _HotTailEntry(NamedTuple):
+    feed_id: object
+    rss_id: object
+    encoded: bytes
+
+
+class HotTailCache:
+    '''
+    A bounded in-memory copy of the most recent committed rows.
+
+    All rows with `ROWID > base_rowid` (up to `max_rowid`) are in the cache,
+    so a read which starts after `base_rowid` can be answered without the database.
+
+    An updated row is inserted again with a new ROWID, the entry of the old ROWID is removed.
+    '''
+
+    def __init__(self, *, max_count: int = 1000, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._rowids: list[int] = []
+        self._entries: dict[int, _HotTailEntry] = {}
+        self._rowid_by_key: dict[tuple[object, object], int] = {}
+        self._bytes = 0
+        self._base_rowid: int | None = None
+        self._max_rowid: int | None = None
+
+    def __len__(self) -> int:
+        return len(self._rowids)
+
+    @property
+    def base_rowid(self) -> int | None:
+        return self._base_rowid
+
+    @property
+    def max_rowid(self) -> int | None:
+        return self._max_rowid
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def _clear(self) -> None:
+        self._rowids.clear()
+        self._entries.clear()
+        self._rowid_by_key.clear()
+        self._bytes = 0
+        self._base_rowid = None
+        self._max_rowid = None
+
+    def _pop_entry(self, rowid: int) -> None:
+        entry = self._entries.pop(rowid)
+        del self._rowid_by_key[(entry.feed_id, entry.rss_id)]
+        self._bytes -= len(entry.encoded)
+
+    def _evict(self) -> None:
+        count = 0
+        size = len(self._rowids)
+        while count < size and (size - count > self.max_count or self._bytes > self.max_bytes):
+            self._pop_entry(self._rowids[count])
+            count += 1
+        if count:
+            self._base_rowid = self._rowids[count - 1]
+            del self._rowids[:count]
+
+    def extend(self, after_rowid: int, items: Iterable[Mapping[str, object]], *,
+            discard_until: int | None = None) -> None:
+        '''
+        Add committed rows, `items` must be all the rows with `ROWID > after_rowid`, ordered by ROWID.
+
+        If `discard_until` is not None, the rows with `ROWID <= discard_until` are removed in the same lock,
+        so the readers never see the rows which were removed in the same transaction.
+        '''
+        with self._lock:
+            if self._max_rowid != after_rowid:
+                # the cache does not continue to the new rows, restart from here.
+                self._clear()
+                self._base_rowid = self._max_rowid = after_rowid
+            elif discard_until is not None:
+                self._discard_until(discard_until)
+
+            for item in items:
+                rowid = item['rowid']
+                assert isinstance(rowid, int) and rowid > self._max_rowid
+                entry = _HotTailEntry(item['feed_id'], item['rss_id'], encode_item(item))
+                if (old_rowid := self._rowid_by_key.get((entry.feed_id, entry.rss_id))) is not None:
+                    self._pop_entry(old_rowid)
+                    del self._rowids[bisect_right(self._rowids, old_rowid) - 1]
+                self._rowids.append(rowid)
+                self._entries[rowid] = entry
+                self._rowid_by_key[(entry.feed_id, entry.rss_id)] = rowid
+                self._bytes += len(entry.encoded)
+                self._max_rowid = rowid
+
+            self._evict()
+
+    def discard_until(self, rowid: int) -> None:
+        '''
+        Remove the rows with `ROWID <= rowid`, which were removed from the database.
+        '''
+        with self._lock:
+            self._discard_until(rowid)
+
+    def _discard_until(self, rowid: int) -> None:
+        count = bisect_right(self._rowids, rowid)
+        for x in self._rowids[:count]:
+            self._pop_entry(x)
+        del self._rowids[:count]
+
+    def read_encoded(self, start_rowid: int, limit: int, feed_ids: Sequence[str] | None = None, *,
+            max_rowid: int | None) -> list[bytes] | None:
+        '''
+        Read the encoded items after `start_rowid` from the cache.
+
+        `max_rowid` is the current max ROWID of the database,
+        return None if the cache is out of date or it does not contains all the items after `start_rowid`.
+        '''
+        with self._lock:
+            if self._base_rowid is None or start_rowid < self._base_rowid or self._max_rowid != (max_rowid or 0):
+                return None
+
+            items: list[bytes] = []
+            for index in range(bisect_right(self._rowids, start_rowid), len(self._rowids)):
+                if len(items) >= limit:
+                    break
+                entry = self._entries[self._rowids[index]]
+                if not feed_ids or entry.feed_id in feed_ids:
+                    items.append(entry.encoded)
+            return items
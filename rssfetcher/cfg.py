@@ -14,6 +14,7 @@ from typing import Dict, Iterable, Literal, NotRequired, Optional, Tuple, TypedD
 import yaml
 from cachetools import cachedmethod
 
+from .caches import HotTailCache
 from .stores import SqliteRssStore, open_store
 
 logger = getLogger(__name__)
@@ -37,6 +38,7 @@ class FeedSection(TypedDict):
 
 class OptionsSection(TypedDict):
     kept_count: NotRequired[int]
+    stream_writes: NotRequired[bool]
 
 
 class RootSection(TypedDict):
@@ -79,6 +81,8 @@ class ConfigHelper:
     def __init__(self, config_path: str | None) -> None:
         self.__config_path = config_path
         self.__config: Config | None = None
+        # only the server mode need to keep the recent items in memory
+        self.hot_tail_cache: HotTailCache | None = None
 
     @property
     def config_path(self) -> str:
@@ -119,6 +123,8 @@ class ConfigHelper:
             logger.info('Database: %s', config.get_conn_str())
             if is_store_updated:
                 config.init_store()
+                if self.hot_tail_cache is not None:
+                    self.hot_tail_cache.clear()
             else:
                 logger.info('Database connect string not changed, skip init.')
             return True
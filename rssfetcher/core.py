@@ -6,24 +6,23 @@
 # ----------
 
 import logging
-import queue
-import threading
 import xml.etree.ElementTree as et
-from collections.abc import Iterable, Iterator
+from collections.abc import Iterator, Mapping
 from functools import cache
 from io import StringIO
-from time import monotonic, sleep
-from typing import Callable, cast
+from itertools import batched
+from typing import ContextManager
 from urllib.parse import urlparse
 
 import requests
-from pydantic import ValidationError
-from schedule import Scheduler
 
-from ._utils import create_unique_id
-from .cfg import Config, ConfigHelper, FeedSection
+from ._utils import create_unique_id, read_settings_env
+from .cfg import ConfigHelper, FeedSection
 from .models import RssItemRowRecord
-from .settings import Settings
+from .stores import SqliteRssStore
+from .tracing import accumulate, span
+
+_UPSERT_CHUNK_SIZE = 500
 
 
 @cache
@@ -48,13 +47,19 @@ def _read_element_text(elements: list[et.Element | None] | et.Element | None) ->
                 return el.text
 
 def _element_to_RssItemRowRecord(feed_id: str, item: et.Element, feed_section: FeedSection, *,
-        logger: logging.Logger) -> RssItemRowRecord:
+        logger: logging.Logger, stages: Mapping[str, ContextManager[None]]) -> RssItemRowRecord:
     '''
     Convert an XML item element to a RssItemRowRecord.
+
+    `stages` are the timers of the `dump_xml` and the `hash` stage, see `tracing.accumulate`.
     '''
     unique_id = _read_element_text(item.find('guid'))
     title = _read_element_text(item.find('title'))
-    raw = dump_xml(item)
+    with stages['dump_xml']:
+        raw = dump_xml(item)
+    # the content hash is required by the store to detect the updated items.
+    with stages['hash']:
+        content_hash = create_unique_id(raw)
 
     if not unique_id:
         logger.debug('item %r has no guid id', item)
@@ -64,223 +69,245 @@ def _element_to_RssItemRowRecord(feed_id: str, item: et.Element, feed_section: F
             case 'title':
                 unique_id = title
             case 'content':
-                unique_id = create_unique_id(raw)
+                unique_id = content_hash
             case _ as val:
                 logger.warning('Unknown guid_from value: %s', val)
         if not unique_id:
-            unique_id = create_unique_id(raw)
+            unique_id = content_hash
 
     assert unique_id
-    rd: RssItemRowRecord = {
-        'feed_id': feed_id,
-        'rss_id': unique_id,
-        'title': title,
-        'raw': raw
-    }
-    return rd
-
-def fetch_feed(feed_id: str, feed_section: FeedSection) -> Iterable[RssItemRowRecord]:
-    collected_items: list[RssItemRowRecord] = []
-
-    url = feed_section.get('url')
-    if url and feed_section.get('enable', True):
-        logger = get_logger().getChild(url)
-        proxies = feed_section.get('proxies')
-        if proxies is None:
-            proxy = feed_section.get('proxy')
-            if proxy:
-                scheme = urlparse(proxy).scheme
-                if not scheme:
-                    scheme = urlparse(url).scheme or 'http'
-                    proxy = scheme + '://' + proxy
-                proxies = {}
-                proxies[scheme] = proxy
-
-        if proxies:
-            logger.info('use proxies: %s', proxies)
-
-        try:
-            r = requests.get(url, proxies=proxies, timeout=(5, 60))
-        except (requests.ConnectionError, requests.ReadTimeout) as error:
-            logger.info('fetch %r failure with %s', url, error, exc_info=False)
-            return []
-
+    return RssItemRowRecord(feed_id, unique_id, title, raw, content_hash)
+
+def _get_proxies(url: str, feed_section: FeedSection) -> dict[str, str] | None:
+    proxies = feed_section.get('proxies')
+    if proxies is None:
+        proxy = feed_section.get('proxy')
+        if proxy:
+            scheme = urlparse(proxy).scheme
+            if not scheme:
+                scheme = urlparse(url).scheme or 'http'
+                proxy = scheme + '://' + proxy
+            proxies = {}
+            proxies[scheme] = proxy
+    return proxies
+
+def _download_feed_tree(url: str, proxies: dict[str, str] | None, *, logger: logging.Logger) -> et.Element | None:
+    try:
+        # stream the body so the connect stage and the download stage can be timed separately
+        with span('connect', url=url):
+            r = requests.get(url, proxies=proxies, timeout=(5, 60), stream=True)
+    except (requests.ConnectionError, requests.ReadTimeout) as error:
+        logger.info('fetch %r failure with %s', url, error, exc_info=False)
+        return None
+
+    with r:
         try:
             r.raise_for_status()
         except requests.HTTPError as error:
             logger.error('raised %s: %s', type(error).__name__, error)
-            return []
+            return None
 
         r.encoding = 'utf8'
         try:
-            body = r.text
+            with span('download', url=url):
+                body = r.text
         except (requests.ConnectionError, requests.Timeout) as error:
             logger.error('raised %s: %s', type(error).__name__, error)
-        else:
-            try:
-                el = et.fromstring(body)
-            except et.ParseError:
-                logger.error('invalid xml.')
-            else:
-                for item in el.iter('item'):
-                    if rd := _element_to_RssItemRowRecord(feed_id, item, feed_section, logger=logger):
-                        collected_items.append(rd)
+            return None
 
-                logger.info('total found %s items',len(collected_items))
+    try:
+        with span('parse', url=url):
+            return et.fromstring(body)
+    except et.ParseError:
+        logger.error('invalid xml.')
+        return None
 
-    return collected_items
+type _FeedTreeKey = tuple[str, tuple[tuple[str, str], ...]]
 
-def fetch_feeds(config_helper: ConfigHelper, feeds: list[tuple[str, FeedSection]]) -> None:
-    options = config_helper.get_config().config_data.get('options', {})
-    kept_count = options.get('kept_count') if options else None
+def _get_feed_tree_key(url: str, proxies: dict[str, str] | None) -> _FeedTreeKey:
+    return url, tuple(sorted(proxies.items())) if proxies else ()
 
-    # fetch from internet:
-    fetched: list[RssItemRowRecord] = []
-    for feed_id, feed_section in feeds:
-        try:
-            items = fetch_feed(feed_id, feed_section)
-        except Exception as error:
-            get_logger().error('fetch %r failure with %s', feed_id, error, exc_info=True)
-        else:
-            fetched.extend(items)
+class FeedTreeLoader:
+    '''
+    Reuse the downloaded and parsed feed for the feeds which have the same url and proxies.
 
-    if not fetched:
-        return
+    Only the last feed is kept, so the feeds should be loaded group by group (see `_group_feeds_by_source`);
+    the kept feed is dropped before the next download or on `clear()`.
+    '''
 
-    with config_helper.open_store() as store:
-        # save:
-        count = store.get_count()
-        store.upsert(fetched)
-        count = store.get_count() - count
-        get_logger().info('total added %s rss', count)
+    def __init__(self) -> None:
+        self._key: _FeedTreeKey | None = None
+        self._tree: et.Element | None = None
 
-        # remove old items:
-        if isinstance(kept_count, int) and kept_count >= 10: # hard limit
-            removed_count = store.remove_old_items(kept_count)
+    def load(self, url: str, proxies: dict[str, str] | None, *, logger: logging.Logger) -> et.Element | None:
+        key = _get_feed_tree_key(url, proxies)
+        if key == self._key:
+            logger.info('reuse the fetched %r', url)
+            return self._tree
+
+        self.clear()
+        tree = _download_feed_tree(url, proxies, logger=logger)
+        self._key, self._tree = key, tree
+        return tree
+
+    def clear(self) -> None:
+        self._key = self._tree = None
+
+def iter_feed_items(feed_id: str, feed_section: FeedSection, *,
+        tree_loader: FeedTreeLoader | None = None) -> Iterator[RssItemRowRecord]:
+    '''
+    Fetch the feed and yield the items one by one.
+
+    With `tree_loader`, the feeds which have the same url and proxies share one download and parse.
+    '''
+    url = feed_section.get('url')
+    if url and feed_section.get('enable', True):
+        logger = get_logger().getChild(url)
+        proxies = _get_proxies(url, feed_section)
+
+        if proxies:
+            logger.info('use proxies: %s', proxies)
+
+        if tree_loader is not None:
+            el = tree_loader.load(url, proxies, logger=logger)
         else:
-            removed_count = 0
-        get_logger().info('removed outdated %r items.', removed_count)
+            el = _download_feed_tree(url, proxies, logger=logger)
+        if el is not None:
+            rss_ids: set[str] = set()
+            # convert chunk by chunk, and only yield after the `convert` span is closed,
+            # so the work of the caller (e.g. upsert) is not counted for the `convert` stage.
+            for elements in batched(el.iter('item'), _UPSERT_CHUNK_SIZE):
+                converted: list[RssItemRowRecord] = []
+                with span('convert', feed_id=feed_id), \
+                        accumulate('dump_xml', 'hash', feed_id=feed_id) as stages:
+                    for item in elements:
+                        rd = _element_to_RssItemRowRecord(feed_id, item, feed_section, logger=logger, stages=stages)
+                        # the store only keep the first item of the same guid,
+                        # drop the others here so they cannot replace it from another chunk.
+                        if rd.rss_id in rss_ids:
+                            logger.debug('drop the duplicated item %r', rd.rss_id)
+                            continue
+                        rss_ids.add(rd.rss_id)
+                        converted.append(rd)
+                yield from converted
+
+            logger.info('total found %s items', len(rss_ids))
+
+def fetch_feed(feed_id: str, feed_section: FeedSection, *,
+        tree_loader: FeedTreeLoader | None = None) -> list[RssItemRowRecord]:
+    return list(iter_feed_items(feed_id, feed_section, tree_loader=tree_loader))
+
+def _save_fetched(config_helper: ConfigHelper, store: SqliteRssStore, *,
+        count: int, max_id: int, written: int, kept_count: int | None) -> None:
+    '''
+    Finish the writes after the fetched items are upserted.
+
+    `count` and `max_id` are the count and the max ROWID of the store before the upsert,
+    `written` is the count of the inserted and updated rows.
+    '''
+    count = store.get_count() - count
+    get_logger().info('total added %s rss', count)
+    get_logger().info('total updated %s rss', written - count)
 
+    # remove old items:
+    if isinstance(kept_count, int) and kept_count >= 10: # hard limit
+        with span('remove_old_items'):
+            removed_count = store.remove_old_items(kept_count)
+    else:
+        removed_count = 0
+    get_logger().info('removed outdated %r items.', removed_count)
+
+    with span('commit'):
         store.commit()
 
-type _JobQueueItem = tuple[str, FeedSection]
-
-class RssFetcherWorker:
-    def __init__(self, config_helper: ConfigHelper) -> None:
-        self._config_helper = config_helper
-        self._job_queue: queue.Queue[_JobQueueItem | None] = queue.Queue()
-        self._is_shutdown = False
-        self._scheduler = Scheduler()
-
-    def start(self) -> None:
-        config_helper = self._config_helper
-        job_queue = self._job_queue
-        scheduler = self._scheduler
-        logger = get_logger()
-
-        def run_on_background(func: Callable[..., None]) -> None:
-            threading.Thread(target=func, daemon=True).start()
-
-        @run_on_background
-        def consumer() -> None:
-            def filter_unique_feeds(feeds: Iterable[_JobQueueItem]) -> Iterator[_JobQueueItem]:
-                s = set()
-                for f in feeds:
-                    if f[0] not in s:
-                        s.add(f[0])
-                        yield f
-
-            def get_feeds_in_10s() -> list[_JobQueueItem | None]:
-                feeds = [job_queue.get()]
-                start = monotonic()
-                wait_time = 10
-                while wait_time > 0:
-                    if feeds[-1] is None:
-                        break
+    # cache the recent items:
+    if (hot_tail_cache := config_helper.hot_tail_cache) is not None:
+        with span('hot_tail_cache'):
+            # only the last rows can be kept by the cache, do not read the others.
+            items = store.read_last_items(max_id, hot_tail_cache.max_count)
+            if len(items) < hot_tail_cache.max_count:
+                after_rowid = max_id
+            else:
+                # there may be more rows before, so the cache restarts from the first read row.
+                after_rowid = items[0]['rowid'] - 1
+            # the removed rows must be discarded with the new rows at once,
+            # or the readers may see them between the two updates.
+            discard_until = None
+            if removed_count:
+                min_id = store.get_min_id()
+                discard_until = after_rowid if min_id is None else min_id - 1
+            hot_tail_cache.extend(after_rowid, [dict(x) for x in items], discard_until=discard_until)
+
+def _group_feeds_by_source(feeds: list[tuple[str, FeedSection]]) -> list[tuple[str, FeedSection]]:
+    '''
+    Reorder the feeds, so the feeds which have the same url and proxies are fetched one after another,
+    and they can share one download by `FeedTreeLoader`.
+    '''
+    groups: dict[_FeedTreeKey | None, list[tuple[str, FeedSection]]] = {}
+    for feed_id, feed_section in feeds:
+        key = _get_feed_tree_key(url, _get_proxies(url, feed_section)) if (url := feed_section.get('url')) else None
+        groups.setdefault(key, []).append((feed_id, feed_section))
+    return [x for group in groups.values() for x in group]
+
+def fetch_feeds(config_helper: ConfigHelper, feeds: list[tuple[str, FeedSection]]) -> None:
+    options = config_helper.get_config().config_data.get('options', {})
+    kept_count = options.get('kept_count') if options else None
+    stream_writes = options.get('stream_writes', False) if options else False
+    feeds = _group_feeds_by_source(feeds)
+    tree_loader = FeedTreeLoader()
+
+    with span('fetch_feeds', count=len(feeds)):
+        if stream_writes:
+            # write the items of each feed in chunks while fetching,
+            # so only the items of one feed are kept in memory.
+            # all chunks are written in one transaction, which commit after all feeds are fetched;
+            # each feed is written in a savepoint, so a failed feed is dropped as a whole like the buffered mode.
+            with config_helper.open_store() as store:
+                count = store.get_count()
+                max_id = store.get_max_id() or 0
+                written = 0
+                for feed_id, feed_section in feeds:
+                    feed_written = 0
                     try:
-                        last = job_queue.get(timeout=wait_time)
-                    except queue.Empty:
-                        break
+                        with span('fetch_feed', feed_id=feed_id), store.savepoint('fetch_feed'):
+                            items = iter_feed_items(feed_id, feed_section, tree_loader=tree_loader)
+                            for chunk in batched(items, _UPSERT_CHUNK_SIZE):
+                                with span('upsert', count=len(chunk)):
+                                    feed_written += store.upsert(chunk)
+                    except Exception as error:
+                        get_logger().error('fetch %r failure with %s', feed_id, error, exc_info=True)
                     else:
-                        feeds.append(last)
-                    wait_time = start + 10 - monotonic()
-                return feeds
+                        written += feed_written
+                tree_loader.clear()
 
-            while True:
-                feeds = get_feeds_in_10s()
+                _save_fetched(config_helper, store,
+                    count=count, max_id=max_id, written=written, kept_count=kept_count)
+
+        else:
+            # fetch from internet:
+            fetched: list[RssItemRowRecord] = []
+            for feed_id, feed_section in feeds:
                 try:
-                    if None not in feeds:
-                        feeds = cast(list[tuple[str, FeedSection]], feeds)
-                        unique_feeds = list(filter_unique_feeds(feeds))
-                        get_logger().info('Receive %d fetch jobs.', len(unique_feeds))
-                        assert unique_feeds
-                        fetch_feeds(self._config_helper, unique_feeds)
-                    else:
-                        return # end
-                finally:
-                    for _ in range(len(feeds)):
-                        job_queue.task_done()
-
-        @run_on_background
-        def producer() -> None:
-            local_snapshot: dict[str, FeedSection] = {}
-            local_config: Config | None = None
-
-            def put_job(job: _JobQueueItem, /) -> None:
-                if self._is_shutdown:
-                    scheduler.clear()
-                elif config_helper.reload_config_if_updated():
-                    logger.info('Config reloaded. Cancel current job %s, try reschedule...', job[0])
-                    update_from_config(config_helper.get_config())
+                    with span('fetch_feed', feed_id=feed_id):
+                        items = fetch_feed(feed_id, feed_section, tree_loader=tree_loader)
+                except Exception as error:
+                    get_logger().error('fetch %r failure with %s', feed_id, error, exc_info=True)
                 else:
-                    job_queue.put(job)
-
-            def update_from_config(config: Config) -> None:
-                nonlocal local_config
-                local_config = config
-
-                feeds_map = {x[0]: x[1] for x in config.iter_feeds()}
-                feeds_ids = set(feeds_map)
-
-                # del removed
-                for feed_id in (set(local_snapshot) - feeds_ids):
-                    logger.info('Config updated: removed %s.', feed_id)
-                    scheduler.clear(tag=feed_id)
-                    del local_snapshot[feed_id]
-
-                # update changed
-                for feed_id, feed in feeds_map.items():
-                    if local_snapshot.get(feed_id) != feed:
-                        logger.info('Config updated: upsert %s.', feed_id)
-                        scheduler.clear(tag=feed_id)
-                        local_snapshot[feed_id] = feed
-
-                        job_args: _JobQueueItem = (feed_id, feed)
-                        if isinstance(interval := feed.get('interval', 15), int):
-                            minutes = max(interval, 5)
-                        else:
-                            minutes = 15
-                        scheduler.every(minutes).minutes.do(put_job, job_args).tag(feed_id)
-                        put_job(job_args) # put now
-
-                assert len(scheduler.jobs) == len(feeds_map)
-                logger.info('Totally %d jobs are scheduled.', len(scheduler.jobs))
-
-            update_from_config(config_helper.get_config())
-
-            try:
-                while scheduler.idle_seconds is not None:
-                    scheduler.run_pending()
-                    sleep(1)
-            except KeyboardInterrupt:
-                pass
+                    fetched.extend(items)
+            tree_loader.clear()
 
-    def shutdown(self) -> None:
-        get_logger().info('Shutting down RssFetcherWorker...')
-        self._is_shutdown = True
-        self._job_queue.put(None)
-        self._job_queue.join()
+            if not fetched:
+                return
 
+            with config_helper.open_store() as store:
+                # save:
+                count = store.get_count()
+                max_id = store.get_max_id() or 0
+                with span('upsert', count=len(fetched)):
+                    written = store.upsert(fetched)
+
+                _save_fetched(config_helper, store,
+                    count=count, max_id=max_id, written=written, kept_count=kept_count)
 
 def configure_logger() -> None:
     logging.basicConfig(
@@ -292,13 +319,7 @@ def configure_logger() -> None:
 
 
 def load_config_helper() -> ConfigHelper:
-    def _load_settings() -> Settings:
-        try:
-            return Settings() # type: ignore
-        except ValidationError as e:
-            get_logger().error(e)
-            exit()
-
-    settings = _load_settings()
-    config_helper = ConfigHelper(settings.config)
+    # same as `settings.Settings().config`, read from the environment directly
+    # so the one-shot fetcher does not need to import pydantic.
+    config_helper = ConfigHelper(read_settings_env('config'))
     return config_helper
@@ -5,11 +5,17 @@
 # 
 # ----------
 
-from typing import TypedDict
+from typing import NamedTuple
 
 
-class RssItemRowRecord(TypedDict):
+class RssItemRowRecord(NamedTuple):
+    '''
+    A row of the rss table, the fields are ordered as the columns.
+
+    `hash` is the content hash of `raw`, the store computes it when it is None.
+    '''
     feed_id: str
     rss_id: str
     title: str | None
     raw: str
+    hash: str | None = None
@@ -9,13 +9,18 @@ from collections.abc import AsyncIterator, Iterator
 from contextlib import asynccontextmanager
 from typing import Annotated, cast
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, Response, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.security import APIKeyHeader, APIKeyQuery
 
+from .caches import HotTailCache
 from .cfg import Config, ConfigHelper
-from .core import RssFetcherWorker, configure_logger, load_config_helper
-from .settings import SettingsDeps
+from .core import configure_logger, load_config_helper
+from .settings import Settings, load_settings
 from .stores import SqliteRssStore
+from .worker import RssFetcherWorker
+
+# error if use Depends(Settings)
+SettingsDeps = Annotated[Settings, Depends(load_settings)]
 
 
 def _get_config_from_request(request: Request) -> Config:
@@ -30,6 +35,12 @@ def _open_store(config: ConfigDeps) -> Iterator[SqliteRssStore]:
 
 StoreDeps = Annotated[SqliteRssStore, Depends(_open_store, use_cache=False)]
 
+def _get_hot_tail_cache_from_request(request: Request) -> HotTailCache | None:
+    config_helper = cast(ConfigHelper, request.app.state.config_helper)
+    return config_helper.hot_tail_cache
+
+HotTailCacheDeps = Annotated[HotTailCache | None, Depends(_get_hot_tail_cache_from_request)]
+
 
 def _verify_api_key(
     settings: SettingsDeps,
@@ -46,17 +57,28 @@ def _verify_api_key(
 router = APIRouter()
 
 
-@router.head("/items", dependencies=[Depends(_verify_api_key)])
-@router.get("/items", dependencies=[Depends(_verify_api_key)])
+@router.head("/items", dependencies=[Depends(_verify_api_key)], response_model=None)
+@router.get("/items", dependencies=[Depends(_verify_api_key)], response_model=None)
 async def get_items(
     store: StoreDeps,
+    hot_tail_cache: HotTailCacheDeps,
     start_rowid: int = 0, limit: int | None = None,
-) -> dict:
+    feed_id: Annotated[list[str] | None, Query()] = None,
+) -> dict | Response:
     limit_max = 1000
     limit = min(max(limit, 1), limit_max) if isinstance(
         limit, int) else limit_max
 
-    readed_items = store.read_items_as_dict(start_rowid, limit + 1)
+    if hot_tail_cache is not None:
+        cached_items = hot_tail_cache.read_encoded(start_rowid, limit + 1, feed_id, max_rowid=store.get_max_id())
+        if cached_items is not None:
+            content = b''.join([
+                b'{"end":', b'true' if len(cached_items) <= limit else b'false',
+                b',"items":[', b','.join(cached_items[:limit]), b']}',
+            ])
+            return Response(content=content, media_type='application/json')
+
+    readed_items = store.read_items_as_dict(start_rowid, limit + 1, feed_ids=feed_id)
     return {
         'end': len(readed_items) <= limit,
         'items': readed_items[:limit],
@@ -87,6 +109,7 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
 
     config_helper = load_config_helper()
     config_helper.get_config().init_store()
+    config_helper.hot_tail_cache = HotTailCache()
     app.state.config_helper = config_helper
 
     worker = RssFetcherWorker(config_helper)
@@ -5,15 +5,14 @@
 # 
 # ----------
 
-from typing import Annotated
-
-from fastapi import Depends
 from pydantic_settings import BaseSettings
 
+from ._utils import SETTINGS_ENV_PREFIX
+
 
 class Settings(BaseSettings):
     model_config = {
-        'env_prefix': 'RSSFETCHER_',
+        'env_prefix': SETTINGS_ENV_PREFIX,
     }
 
     config: str | None = None
@@ -21,6 +20,3 @@ class Settings(BaseSettings):
 
 def load_settings() -> Settings:
     return Settings()
-
-# error if use Depends(Settings)
-SettingsDeps = Annotated[Settings, Depends(load_settings)]
@@ -6,7 +6,10 @@
 # ----------
 
 import sqlite3
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import contextmanager
 
+from ._utils import create_unique_id
 from .models import RssItemRowRecord
 
 
@@ -26,6 +29,10 @@ class RssStore:
 
 class SqliteRssStore(RssStore):
     TABLE_NAME = 'rss'
+    INDEX_NAME_FEED_ID = 'rss_feed_id_rowid'
+    # the content hash of the row, which is managed by the store
+    COLUMN_NAME_HASH = 'hash'
+    FUNCTION_NAME_HASH = 'rssfetcher_hash'
 
     def __init__(self, conn_str: str) -> None:
         self.__conn_str = conn_str
@@ -66,11 +73,30 @@ class SqliteRssStore(RssStore):
             self.COLUMN_NAME_RSS_ID  + ' TEXT NOT NULL',
             self.COLUMN_NAME_TITLE   + ' TEXT',
             self.COLUMN_NAME_RAW     + ' TEXT',
+            self.COLUMN_NAME_HASH    + ' TEXT',
             'PRIMARY KEY ({}, {})'.format(self.COLUMN_NAME_FEED_ID, self.COLUMN_NAME_RSS_ID),
         ])
         SQL_CREATE = 'CREATE TABLE IF NOT EXISTS {} ({});'.format(self.TABLE_NAME, DEF_COL)
         self._cur.execute(SQL_CREATE)
 
+        # migrate the databases which created before the hash column,
+        # the hash of the existing rows must be filled, or all of them will be seen as updated on the next fetch.
+        columns = [x[1] for x in self._cur.execute('PRAGMA table_info({})'.format(self.TABLE_NAME)).fetchall()]
+        if self.COLUMN_NAME_HASH not in columns:
+            self._cur.execute('ALTER TABLE {} ADD COLUMN {} TEXT'.format(self.TABLE_NAME, self.COLUMN_NAME_HASH))
+            self._conn.create_function(self.FUNCTION_NAME_HASH, 1, self._compute_hash, deterministic=True)
+            self._cur.execute('UPDATE {0} SET {1} = {2}({3}) WHERE {1} IS NULL'.format(
+                self.TABLE_NAME, self.COLUMN_NAME_HASH, self.FUNCTION_NAME_HASH, self.COLUMN_NAME_RAW
+            ))
+
+        # sqlite appends the ROWID to every index entry, so this index is ordered by (feed_id, ROWID)
+        # and serves the feed filtered reads without scanning other feeds.
+        # `IF NOT EXISTS` also migrates the databases which created before the index.
+        SQL_CREATE_INDEX = 'CREATE INDEX IF NOT EXISTS {} ON {} ({});'.format(
+            self.INDEX_NAME_FEED_ID, self.TABLE_NAME, self.COLUMN_NAME_FEED_ID
+        )
+        self._cur.execute(SQL_CREATE_INDEX)
+
     def get_count(self) -> int:
         SQL_COUNT = 'SELECT COUNT({}) FROM {}'.format(self.COLUMN_NAME_FEED_ID, self.TABLE_NAME)
         return self._cur.execute(SQL_COUNT).fetchone()[0]
@@ -83,16 +109,45 @@ class SqliteRssStore(RssStore):
         SQL_MIN = 'SELECT MAX(ROWID) FROM {}'.format(self.TABLE_NAME)
         return self._cur.execute(SQL_MIN).fetchone()[0]
 
-    def upsert(self, items: list[RssItemRowRecord]):
-        def torow(item: RssItemRowRecord | tuple) -> tuple:
-            if isinstance(item, dict):
-                return tuple(item.get(x) for x in self.COLUMN_NAMES)
-            assert len(item) == len(self.COLUMN_NAMES), "Item length does not match column names length"
-            return item
-        rows = [torow(item) for item in items]
-        SQL_INSERT = 'INSERT OR IGNORE INTO {} VALUES ({});' \
-            .format(self.TABLE_NAME, ",".join("?" for _ in self.COLUMN_NAMES))
-        self._cur.executemany(SQL_INSERT, rows)
+    @staticmethod
+    def _compute_hash(raw: str | None) -> str | None:
+        return None if raw is None else create_unique_id(raw)
+
+    def upsert(self, items: Iterable[RssItemRowRecord | dict[str, object]]) -> int:
+        '''
+        Insert the new items and update the items which content hash is changed.
+
+        The updated rows are inserted again, so they get a new ROWID like the new rows.
+        If some items have the same key, only the first one is used.
+        The content hash is taken from `RssItemRowRecord.hash`, or computed if it is missing.
+        Return the count of the inserted and updated rows.
+        '''
+        columns_count = len(self.COLUMN_NAMES)
+        raw_index = self.COLUMN_NAMES.index(self.COLUMN_NAME_RAW)
+        def iter_rows() -> Iterable[tuple]:
+            # without this, the duplicated items replace each other on every upsert.
+            keys: set[tuple] = set()
+            for item in items:
+                if isinstance(item, dict):
+                    item = tuple(item.get(x) for x in self.COLUMN_NAMES)
+                assert len(item) in (columns_count, columns_count + 1), \
+                    "Item length does not match column names length"
+                key = (item[0], item[1])
+                if key not in keys:
+                    keys.add(key)
+                    content_hash = item[columns_count] if len(item) > columns_count else None
+                    if content_hash is None:
+                        content_hash = self._compute_hash(item[raw_index])
+                    yield (*item[:columns_count], content_hash, item[0], item[1], content_hash)
+        rows = iter_rows()
+        # the unchanged rows only cost a lookup of the primary key.
+        SQL_UPSERT = 'INSERT OR REPLACE INTO {0} ({1}, {2}) SELECT {3} WHERE NOT EXISTS ' \
+            '(SELECT 1 FROM {0} WHERE {4} = ? AND {5} = ? AND {2} IS ?);'.format(
+                self.TABLE_NAME, ', '.join(self.COLUMN_NAMES), self.COLUMN_NAME_HASH,
+                ', '.join('?' for _ in range(len(self.COLUMN_NAMES) + 1)),
+                self.COLUMN_NAME_FEED_ID, self.COLUMN_NAME_RSS_ID,
+            )
+        return self._cur.executemany(SQL_UPSERT, rows).rowcount
 
     def remove_old_items(self, kept_count: int):
         assert isinstance(kept_count, int) and kept_count > 0 # hard limit
@@ -107,18 +162,62 @@ class SqliteRssStore(RssStore):
     def commit(self):
         self._conn.commit()
 
-    def read_items(self, start_rowid: int, limit: int) -> list[sqlite3.Row]:
-        sql = 'SELECT ROWID, * FROM {} WHERE ROWID > {} ORDER BY ROWID LIMIT {}'.format(
-            self.TABLE_NAME, start_rowid, limit
+    @contextmanager
+    def savepoint(self, name: str) -> Iterator[None]:
+        '''
+        Run the block in a savepoint of the current transaction, the writes of the block are rolled back on error.
+        '''
+        if not self._conn.in_transaction:
+            # without an outer transaction, releasing the savepoint would commit.
+            self._cur.execute('BEGIN')
+        self._cur.execute('SAVEPOINT {}'.format(name))
+        try:
+            yield
+        except BaseException:
+            self._cur.execute('ROLLBACK TO {}'.format(name))
+            self._cur.execute('RELEASE {}'.format(name))
+            raise
+        else:
+            self._cur.execute('RELEASE {}'.format(name))
+
+    def read_items(self, start_rowid: int, limit: int, feed_ids: Sequence[str] | None = None) -> list[sqlite3.Row]:
+        '''
+        Read items after `start_rowid`, if `feed_ids` is not empty, only read items from these feeds.
+        '''
+        columns = ', '.join(('ROWID', ) + self.COLUMN_NAMES)
+        if feed_ids:
+            sql = 'SELECT {} FROM {} WHERE {} IN ({}) AND ROWID > {} ORDER BY ROWID LIMIT {}'.format(
+                columns, self.TABLE_NAME, self.COLUMN_NAME_FEED_ID, ','.join('?' for _ in feed_ids), start_rowid, limit
+            )
+            params = tuple(feed_ids)
+        else:
+            sql = 'SELECT {} FROM {} WHERE ROWID > {} ORDER BY ROWID LIMIT {}'.format(
+                columns, self.TABLE_NAME, start_rowid, limit
+            )
+            params = ()
+
+        self._cur.row_factory = sqlite3.Row # type: ignore
+        reader = self._cur.execute(sql, params)
+        items = reader.fetchall()
+        return items
+
+    def read_last_items(self, start_rowid: int, limit: int) -> list[sqlite3.Row]:
+        '''
+        Read the last `limit` items after `start_rowid`, ordered by ROWID.
+        '''
+        sql = 'SELECT {} FROM {} WHERE ROWID > {} ORDER BY ROWID DESC LIMIT {}'.format(
+            ', '.join(('ROWID', ) + self.COLUMN_NAMES), self.TABLE_NAME, start_rowid, limit
         )
 
         self._cur.row_factory = sqlite3.Row # type: ignore
         reader = self._cur.execute(sql)
         items = reader.fetchall()
+        items.reverse()
         return items
 
-    def read_items_as_dict(self, start_rowid: int, limit: int) -> list[dict[str, object]]:
-        return [dict(x) for x in self.read_items(start_rowid=start_rowid, limit=limit)]
+    def read_items_as_dict(self, start_rowid: int, limit: int,
+            feed_ids: Sequence[str] | None = None) -> list[dict[str, object]]:
+        return [dict(x) for x in self.read_items(start_rowid=start_rowid, limit=limit, feed_ids=feed_ids)]
 
 
 def open_store(conn_str: str):
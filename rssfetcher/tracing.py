@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2025~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# span-style timing for the fetch stages.
+# the exported file use the trace event format,
+# so it can be loaded by chrome://tracing, perfetto or speedscope.
+# ----------
+
+import json
+import os
+import sys
+import threading
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager, nullcontext
+from time import perf_counter_ns
+from typing import TYPE_CHECKING, ContextManager, TextIO
+
+if TYPE_CHECKING:
+    import cProfile
+
+
+class _StageTimer:
+    '''
+    Accumulate the time of a stage which runs once per item.
+    '''
+    __slots__ = ('total_ns', 'count', '_start')
+
+    def __init__(self) -> None:
+        self.total_ns = 0
+        self.count = 0
+        self._start = 0
+
+    def __enter__(self) -> None:
+        self._start = perf_counter_ns()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.total_ns += perf_counter_ns() - self._start
+        self.count += 1
+
+
+class Tracer:
+    def __init__(self, *, profile: bool = False) -> None:
+        self._events: list[dict[str, object]] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._profiles: dict[str, 'cProfile.Profile'] | None = {} if profile else None
+
+    def _get_profile_stack(self) -> list['cProfile.Profile']:
+        try:
+            return self._local.profile_stack
+        except AttributeError:
+            stack = self._local.profile_stack = []
+            return stack
+
+    def _get_profile(self, name: str) -> 'cProfile.Profile':
+        assert self._profiles is not None
+        if (profile := self._profiles.get(name)) is None:
+            import cProfile
+            profile = self._profiles[name] = cProfile.Profile()
+        return profile
+
+    @contextmanager
+    def span(self, name: str, **args: object) -> Iterator[None]:
+        '''
+        Record a complete event around the block.
+
+        When profiling is enabled, the block is also profiled under the stage `name`;
+        nested stages pause the outer profiler, so each function is counted for the innermost stage.
+        '''
+        profile_stack = None
+        if self._profiles is not None:
+            profile_stack = self._get_profile_stack()
+            if profile_stack:
+                profile_stack[-1].disable()
+            profile = self._get_profile(name)
+            profile_stack.append(profile)
+            profile.enable()
+
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = perf_counter_ns()
+
+            if profile_stack is not None:
+                profile_stack.pop().disable()
+                if profile_stack:
+                    profile_stack[-1].enable()
+
+            self._record(name, start, end - start, args)
+
+    @contextmanager
+    def accumulate(self, *names: str, **args: object) -> Iterator[Mapping[str, ContextManager[None]]]:
+        '''
+        Time the stages which run once per item, and record one event for each stage when the block exit.
+
+        The stages are not profiled separately, they are counted for the enclosing stage.
+        '''
+        timers = {name: _StageTimer() for name in names}
+        start = perf_counter_ns()
+        try:
+            yield timers
+        finally:
+            # the stages are interleaved, so lay them out one after another from the start of the block
+            ts = start
+            for name, timer in timers.items():
+                if timer.count:
+                    self._record(name, ts, timer.total_ns, {**args, 'count': timer.count})
+                    ts += timer.total_ns
+
+    def _record(self, name: str, start_ns: int, dur_ns: int, args: dict[str, object]) -> None:
+        event: dict[str, object] = {
+            'name': name,
+            'ph': 'X',
+            'ts': start_ns / 1000,
+            'dur': dur_ns / 1000,
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+
+    def get_events(self) -> list[dict[str, object]]:
+        with self._lock:
+            return list(self._events)
+
+    def export(self, path: str) -> None:
+        '''
+        Write all recorded spans to `path` as a json trace file.
+        '''
+        with open(path, mode='w', encoding='utf8') as fp:
+            json.dump({
+                'traceEvents': self.get_events(),
+                'displayTimeUnit': 'ms',
+            }, fp)
+
+    def print_profile_stats(self, limit: int = 10, file: TextIO | None = None) -> None:
+        '''
+        Print the hottest functions (by own time) of each stage.
+        '''
+        if not self._profiles:
+            return
+
+        import pstats
+
+        file = file or sys.stderr
+        for name, profile in self._profiles.items():
+            print(f'===== stage: {name} =====', file=file)
+            stats = pstats.Stats(profile, stream=file)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(limit)
+
+
+_tracer: Tracer | None = None
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+def set_tracer(tracer: Tracer | None) -> None:
+    global _tracer
+    _tracer = tracer
+
+def span(name: str, **args: object) -> ContextManager[None]:
+    '''
+    Trace the block with the current tracer, or do nothing if no tracer is set.
+    '''
+    if (tracer := _tracer) is None:
+        return nullcontext()
+    return tracer.span(name, **args)
+
+def accumulate(*names: str, **args: object) -> ContextManager[Mapping[str, ContextManager[None]]]:
+    '''
+    Time the per item stages with the current tracer, see `Tracer.accumulate`.
+    '''
+    if (tracer := _tracer) is None:
+        return nullcontext(dict.fromkeys(names, nullcontext()))
+    return tracer.accumulate(*names, **args)
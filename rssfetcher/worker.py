@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2022~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# the background worker of the server mode.
+# ----------
+
+import queue
+import threading
+from collections.abc import Iterable, Iterator
+from time import monotonic, sleep
+from typing import Callable, cast
+
+from schedule import Scheduler
+
+from .cfg import Config, ConfigHelper, FeedSection
+from .core import fetch_feeds, get_logger
+
+type _JobQueueItem = tuple[str, FeedSection]
+
+class RssFetcherWorker:
+    def __init__(self, config_helper: ConfigHelper) -> None:
+        self._config_helper = config_helper
+        self._job_queue: queue.Queue[_JobQueueItem | None] = queue.Queue()
+        self._is_shutdown = False
+        self._scheduler = Scheduler()
+
+    def start(self) -> None:
+        config_helper = self._config_helper
+        job_queue = self._job_queue
+        scheduler = self._scheduler
+        logger = get_logger()
+
+        def run_on_background(func: Callable[..., None]) -> None:
+            threading.Thread(target=func, daemon=True).start()
+
+        @run_on_background
+        def consumer() -> None:
+            def filter_unique_feeds(feeds: Iterable[_JobQueueItem]) -> Iterator[_JobQueueItem]:
+                s = set()
+                for f in feeds:
+                    if f[0] not in s:
+                        s.add(f[0])
+                        yield f
+
+            def get_feeds_in_10s() -> list[_JobQueueItem | None]:
+                feeds = [job_queue.get()]
+                start = monotonic()
+                wait_time = 10
+                while wait_time > 0:
+                    if feeds[-1] is None:
+                        break
+                    try:
+                        last = job_queue.get(timeout=wait_time)
+                    except queue.Empty:
+                        break
+                    else:
+                        feeds.append(last)
+                    wait_time = start + 10 - monotonic()
+                return feeds
+
+            while True:
+                feeds = get_feeds_in_10s()
+                try:
+                    if None not in feeds:
+                        feeds = cast(list[tuple[str, FeedSection]], feeds)
+                        unique_feeds = list(filter_unique_feeds(feeds))
+                        get_logger().info('Receive %d fetch jobs.', len(unique_feeds))
+                        assert unique_feeds
+                        fetch_feeds(self._config_helper, unique_feeds)
+                    else:
+                        return # end
+                finally:
+                    for _ in range(len(feeds)):
+                        job_queue.task_done()
+
+        @run_on_background
+        def producer() -> None:
+            local_snapshot: dict[str, FeedSection] = {}
+            local_config: Config | None = None
+
+            def put_job(job: _JobQueueItem, /) -> None:
+                if self._is_shutdown:
+                    scheduler.clear()
+                elif config_helper.reload_config_if_updated():
+                    logger.info('Config reloaded. Cancel current job %s, try reschedule...', job[0])
+                    update_from_config(config_helper.get_config())
+                else:
+                    job_queue.put(job)
+
+            def update_from_config(config: Config) -> None:
+                nonlocal local_config
+                local_config = config
+
+                feeds_map = {x[0]: x[1] for x in config.iter_feeds()}
+                feeds_ids = set(feeds_map)
+
+                # del removed
+                for feed_id in (set(local_snapshot) - feeds_ids):
+                    logger.info('Config updated: removed %s.', feed_id)
+                    scheduler.clear(tag=feed_id)
+                    del local_snapshot[feed_id]
+
+                # update changed
+                for feed_id, feed in feeds_map.items():
+                    if local_snapshot.get(feed_id) != feed:
+                        logger.info('Config updated: upsert %s.', feed_id)
+                        scheduler.clear(tag=feed_id)
+                        local_snapshot[feed_id] = feed
+
+                        job_args: _JobQueueItem = (feed_id, feed)
+                        if isinstance(interval := feed.get('interval', 15), int):
+                            minutes = max(interval, 5)
+                        else:
+                            minutes = 15
+                        scheduler.every(minutes).minutes.do(put_job, job_args).tag(feed_id)
+                        put_job(job_args) # put now
+
+                assert len(scheduler.jobs) == len(feeds_map)
+                logger.info('Totally %d jobs are scheduled.', len(scheduler.jobs))
+
+            update_from_config(config_helper.get_config())
+
+            try:
+                while scheduler.idle_seconds is not None:
+                    scheduler.run_pending()
+                    sleep(1)
+            except KeyboardInterrupt:
+                pass
+
+    def shutdown(self) -> None:
+        get_logger().info('Shutting down RssFetcherWorker...')
+        self._is_shutdown = True
+        self._job_queue.put(None)
+        self._job_queue.join()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2025~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import json
+
+from rssfetcher.caches import HotTailCache
+
+def _item(rowid: int, feed_id: str = 'feed1') -> dict[str, object]:
+    return {'rowid': rowid, 'feed_id': feed_id, 'rss_id': f'rss{rowid}', 'title': f'标题 {rowid}', 'raw': '<item/>'}
+
+def _read(cache: HotTailCache, start_rowid: int, limit: int = 10, feed_ids=None, *, max_rowid: int | None):
+    items = cache.read_encoded(start_rowid, limit, feed_ids, max_rowid=max_rowid)
+    return None if items is None else [json.loads(x) for x in items]
+
+def test_hot_tail_cache_read():
+    cache = HotTailCache()
+    assert _read(cache, 0, max_rowid=None) is None
+
+    cache.extend(2, [_item(3), _item(4, 'feed2'), _item(6)])
+    assert _read(cache, 2, max_rowid=6) == [_item(3), _item(4, 'feed2'), _item(6)]
+    assert _read(cache, 3, limit=1, max_rowid=6) == [_item(4, 'feed2')]
+    assert _read(cache, 3, feed_ids=['feed1'], max_rowid=6) == [_item(6)]
+    assert _read(cache, 6, max_rowid=6) == []
+    # the cache does not contains the rows before:
+    assert _read(cache, 1, max_rowid=6) is None
+    # the database has newer rows:
+    assert _read(cache, 2, max_rowid=7) is None
+
+def test_hot_tail_cache_extend():
+    cache = HotTailCache()
+    cache.extend(0, [_item(1), _item(2)])
+    cache.extend(2, [_item(3)])
+    assert _read(cache, 0, max_rowid=3) == [_item(1), _item(2), _item(3)]
+
+    # not continue from the cached rows:
+    cache.extend(5, [_item(6)])
+    assert _read(cache, 0, max_rowid=6) is None
+    assert _read(cache, 5, max_rowid=6) == [_item(6)]
+
+def test_hot_tail_cache_evict():
+    cache = HotTailCache(max_count=2)
+    cache.extend(0, [_item(1), _item(2), _item(3)])
+    assert len(cache) == 2
+    assert cache.base_rowid == 1
+    assert _read(cache, 0, max_rowid=3) is None
+    assert _read(cache, 1, max_rowid=3) == [_item(2), _item(3)]
+
+    cache = HotTailCache(max_bytes=1)
+    cache.extend(0, [_item(1), _item(2)])
+    assert len(cache) == 0
+    assert _read(cache, 2, max_rowid=2) == []
+
+def test_hot_tail_cache_discard_until():
+    cache = HotTailCache()
+    cache.extend(0, [_item(1), _item(2), _item(3)])
+    cache.discard_until(2)
+    assert _read(cache, 0, max_rowid=3) == [_item(3)]
+
+def test_hot_tail_cache_updated_item():
+    cache = HotTailCache()
+    cache.extend(0, [_item(1), _item(2)])
+    updated = dict(_item(1), rowid=3, title='updated')
+    cache.extend(2, [updated])
+    assert len(cache) == 2
+    assert _read(cache, 0, max_rowid=3) == [_item(2), updated]
+
+def test_hot_tail_cache_extend_with_discard_until():
+    cache = HotTailCache()
+    cache.extend(0, [_item(1), _item(2), _item(3)])
+    cache.extend(3, [_item(4)], discard_until=2)
+    assert _read(cache, 0, max_rowid=4) == [_item(3), _item(4)]
+
+    # all rows were removed:
+    cache.extend(4, [], discard_until=4)
+    assert len(cache) == 0
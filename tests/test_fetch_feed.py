@@ -5,8 +5,17 @@
 #
 # ----------
 
+import xml.etree.ElementTree as et
+
+import pytest
+import yaml
+
+from rssfetcher import core
+from rssfetcher.cfg import ConfigHelper
 from rssfetcher.core import fetch_feed, fetch_feeds
+from rssfetcher.models import RssItemRowRecord
 from rssfetcher.stores import RssStore
+from rssfetcher.tracing import Tracer, set_tracer, span
 
 async def _fetch_from_url(url: str):
     return fetch_feed('', { 'url': url })
@@ -19,4 +28,135 @@ async def test_fetch_feed_real_dest():
         'url': 'https://dmhy.org/topics/rss/rss.xml'
     })
     assert items
-    assert set(items[0]).issuperset(RssStore.COLUMN_NAMES)
+    assert set(items[0]._fields).issuperset(RssStore.COLUMN_NAMES)
+
+def _create_config_helper(tmp_path, **options) -> ConfigHelper:
+    config_path = tmp_path / 'config.yml'
+    config_path.write_text(yaml.safe_dump({
+        'database': str(tmp_path / 'rss.sqlite3'),
+        'options': options,
+    }), encoding='utf8')
+    return ConfigHelper(str(config_path))
+
+def _read_rss_ids(config_helper: ConfigHelper) -> list[tuple[str, str]]:
+    with config_helper.open_store() as store:
+        return [(x['feed_id'], x['rss_id']) for x in store.read_items(0, 100)]
+
+def test_fetch_feeds_share_download(tmp_path, monkeypatch):
+    calls = []
+    def download_feed_tree(url, proxies, *, logger):
+        calls.append((url, proxies))
+        return et.fromstring('<rss><channel><item><title>1</title></item></channel></rss>')
+    monkeypatch.setattr(core, '_download_feed_tree', download_feed_tree)
+
+    config_helper = _create_config_helper(tmp_path)
+    fetch_feeds(config_helper, [
+        ('feed1', {'url': 'http://example.com/a'}),
+        ('feed2', {'url': 'http://example.com/b'}),
+        ('feed3', {'url': 'http://example.com/a', 'guid_from': 'title'}),
+        ('feed4', {'url': 'http://example.com/a', 'proxy': 'http://127.0.0.1:1080'}),
+    ])
+
+    assert calls == [
+        ('http://example.com/a', None),
+        ('http://example.com/b', None),
+        ('http://example.com/a', {'http': 'http://127.0.0.1:1080'}),
+    ]
+    # each feed convert the shared tree with its own guid_from:
+    rss_ids = dict(_read_rss_ids(config_helper))
+    assert rss_ids['feed3'] == '1'
+    assert rss_ids['feed1'].startswith('sha1:')
+
+def test_feed_tree_loader_keep_last_tree_only(monkeypatch):
+    calls = []
+    def download_feed_tree(url, proxies, *, logger):
+        calls.append(url)
+        return et.fromstring(f'<rss url="{url}"/>')
+    monkeypatch.setattr(core, '_download_feed_tree', download_feed_tree)
+
+    loader = core.FeedTreeLoader()
+    logger = core.get_logger()
+    tree = loader.load('http://example.com/a', None, logger=logger)
+    assert loader.load('http://example.com/a', None, logger=logger) is tree
+    tree = loader.load('http://example.com/b', None, logger=logger)
+    assert calls == ['http://example.com/a', 'http://example.com/b']
+    assert loader._tree is tree
+
+    loader.clear()
+    assert loader._tree is None
+
+def test_iter_feed_items_drop_duplicated_items(monkeypatch):
+    def download_feed_tree(url, proxies, *, logger):
+        return et.fromstring('<rss><channel><item><guid>1</guid><title>A</title></item>'
+                             '<item><guid>1</guid><title>B</title></item></channel></rss>')
+    monkeypatch.setattr(core, '_download_feed_tree', download_feed_tree)
+
+    items = fetch_feed('feed1', {'url': 'http://example.com/rss'})
+    assert [(x.rss_id, x.title) for x in items] == [('1', 'A')]
+
+@pytest.mark.parametrize('stream_writes', [False, True])
+def test_fetch_feeds_drop_failed_feed(tmp_path, monkeypatch, stream_writes):
+    def iter_feed_items(feed_id, feed_section, *, tree_loader=None):
+        for i in range(feed_section['count']):
+            yield RssItemRowRecord(feed_id, f'rss{i}', f'Title {i}', f'<item>Content {i}</item>')
+        if feed_section.get('broken'):
+            raise ValueError('broken feed')
+    monkeypatch.setattr(core, 'iter_feed_items', iter_feed_items)
+    monkeypatch.setattr(core, '_UPSERT_CHUNK_SIZE', 2)
+
+    config_helper = _create_config_helper(tmp_path, stream_writes=stream_writes)
+    fetch_feeds(config_helper, [
+        ('feed1', {'url': 'http://example.com/1', 'count': 3}),
+        ('feed2', {'url': 'http://example.com/2', 'count': 5, 'broken': True}),
+        ('feed3', {'url': 'http://example.com/3', 'count': 1}),
+    ])
+
+    assert _read_rss_ids(config_helper) == [
+        ('feed1', 'rss0'), ('feed1', 'rss1'), ('feed1', 'rss2'),
+        ('feed3', 'rss0'),
+    ]
+
+    # fetch again, nothing changed:
+    fetch_feeds(config_helper, [('feed1', {'url': 'http://example.com/1', 'count': 4})])
+    assert _read_rss_ids(config_helper)[-1] == ('feed1', 'rss3')
+    assert len(_read_rss_ids(config_helper)) == 5
+
+def test_iter_feed_items_hash_once(monkeypatch):
+    def download_feed_tree(url, proxies, *, logger):
+        return et.fromstring('<rss><channel><item><title>A</title></item>'
+                             '<item><guid>2</guid><title>B</title></item></channel></rss>')
+    monkeypatch.setattr(core, '_download_feed_tree', download_feed_tree)
+
+    tracer = Tracer()
+    set_tracer(tracer)
+    try:
+        items = fetch_feed('feed1', {'url': 'http://example.com/rss', 'guid_from': 'content'})
+    finally:
+        set_tracer(None)
+
+    assert all(x.hash and x.hash.startswith('sha1:') for x in items)
+    # the guid from content reuses the content hash:
+    assert items[0].rss_id == items[0].hash
+    assert items[1].rss_id == '2'
+    assert [x['args']['count'] for x in tracer.get_events() if x['name'] == 'hash'] == [2]
+
+def test_iter_feed_items_does_not_yield_inside_span(monkeypatch):
+    def download_feed_tree(url, proxies, *, logger):
+        return et.fromstring('<rss><channel><item><guid>1</guid></item><item><guid>2</guid></item></channel></rss>')
+    monkeypatch.setattr(core, '_download_feed_tree', download_feed_tree)
+
+    tracer = Tracer(profile=True)
+    set_tracer(tracer)
+    try:
+        with pytest.raises(ValueError):
+            with span('fetch_feed'):
+                for _ in core.iter_feed_items('feed1', {'url': 'http://example.com/rss'}):
+                    with span('upsert'):
+                        raise ValueError
+    finally:
+        set_tracer(None)
+
+    # the failed caller does not leave the `convert` profiler on the stack:
+    assert tracer._get_profile_stack() == []
+    events = {x['name']: x for x in tracer.get_events()}
+    assert events['convert']['ts'] + events['convert']['dur'] <= events['upsert']['ts']
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2025~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import subprocess
+import sys
+
+import rssfetcher
+
+# modules that only the server mode needs
+SERVER_MODULES = (
+    'fastapi', 'starlette', 'uvicorn', 'pydantic', 'pydantic_settings', 'schedule',
+    'rssfetcher.server', 'rssfetcher.settings', 'rssfetcher.worker',
+)
+
+def _import_in_subprocess(module: str) -> set[str]:
+    code = f'import sys; import {module}; print(*sys.modules, sep=chr(10))'
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    return set(output.splitlines())
+
+def test_cli_does_not_import_server_stack():
+    modules = _import_in_subprocess('rssfetcher.__main__')
+    assert not modules.intersection(SERVER_MODULES)
+
+def test_app_is_importable():
+    modules = _import_in_subprocess('rssfetcher')
+    assert not modules.intersection(SERVER_MODULES)
+
+    from rssfetcher import app
+    assert app is not None
+
+def test_app_is_discoverable():
+    # fastapi-cli (`fastapi run rssfetcher`) finds the app by `dir(module)`
+    assert 'app' in dir(rssfetcher)
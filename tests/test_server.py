@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2025~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import pytest
+import yaml
+from fastapi.testclient import TestClient
+
+from rssfetcher import core
+from rssfetcher.caches import HotTailCache
+from rssfetcher.cfg import ConfigHelper
+from rssfetcher.models import RssItemRowRecord
+from rssfetcher.server import app
+
+ITEMS_URLS = [
+    '/items',
+    '/items?start_rowid=2&limit=2',
+    '/items?start_rowid=3',
+    '/items?feed_id=feed1',
+    '/items?feed_id=feed2&limit=1',
+    '/items?feed_id=feed1&feed_id=feed2&start_rowid=3',
+]
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    config_path = tmp_path / 'config.yml'
+    config_path.write_text(yaml.safe_dump({'database': str(tmp_path / 'rss.sqlite3')}), encoding='utf8')
+    monkeypatch.setenv('RSSFETCHER_CONFIG', str(config_path))
+    monkeypatch.delenv('RSSFETCHER_SECRET_KEY', raising=False)
+
+    def iter_feed_items(feed_id, feed_section, *, tree_loader=None):
+        for i in range(feed_section['count']):
+            yield RssItemRowRecord(feed_id, f'rss{i}', f'标题 {i}', f'<item>Content {i}</item>')
+    monkeypatch.setattr(core, 'iter_feed_items', iter_feed_items)
+
+    with TestClient(app) as client:
+        yield client
+
+def _fetch(config_helper: ConfigHelper) -> None:
+    core.fetch_feeds(config_helper, [
+        ('feed1', {'url': 'http://example.com/1', 'count': 3}),
+        ('feed2', {'url': 'http://example.com/2', 'count': 3}),
+    ])
+
+def _assert_cached_items_equals_store_items(client: TestClient, config_helper: ConfigHelper,
+        urls: list[str]) -> None:
+    hot_tail_cache = config_helper.hot_tail_cache
+    assert hot_tail_cache is not None
+    cached = [client.get(url).content for url in urls]
+
+    config_helper.hot_tail_cache = None
+    try:
+        assert cached == [client.get(url).content for url in urls]
+    finally:
+        config_helper.hot_tail_cache = hot_tail_cache
+
+def test_get_items_from_hot_tail_cache(client):
+    config_helper: ConfigHelper = client.app.state.config_helper
+    _fetch(config_helper)
+
+    hot_tail_cache = config_helper.hot_tail_cache
+    assert hot_tail_cache is not None
+    assert len(hot_tail_cache) == 6
+    _assert_cached_items_equals_store_items(client, config_helper, ITEMS_URLS)
+
+def test_get_items_from_truncated_hot_tail_cache(client):
+    config_helper: ConfigHelper = client.app.state.config_helper
+    config_helper.hot_tail_cache = hot_tail_cache = HotTailCache(max_count=4)
+    _fetch(config_helper)
+
+    # only the last rows are read into the cache:
+    assert len(hot_tail_cache) == 4
+    assert hot_tail_cache.base_rowid == 2
+    assert hot_tail_cache.read_encoded(1, 10, max_rowid=6) is None
+    assert hot_tail_cache.read_encoded(2, 10, max_rowid=6) is not None
+    _assert_cached_items_equals_store_items(client, config_helper, ITEMS_URLS[1:])
+
+def test_get_items_after_remove_old_items(client, monkeypatch):
+    config_helper: ConfigHelper = client.app.state.config_helper
+    _fetch(config_helper)
+
+    # trim in the next fetch, the cache must not expose the removed rows:
+    config = config_helper.get_config()
+    monkeypatch.setitem(config.config_data, 'options', {'kept_count': 10})
+    core.fetch_feeds(config_helper, [('feed3', {'url': 'http://example.com/3', 'count': 8})])
+
+    hot_tail_cache = config_helper.hot_tail_cache
+    assert hot_tail_cache is not None
+    assert len(hot_tail_cache) == 10
+    assert hot_tail_cache.read_encoded(4, 20, max_rowid=14) is not None
+    _assert_cached_items_equals_store_items(client, config_helper, ['/items?start_rowid=4', '/items?feed_id=feed2'])
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2025~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import os
+
+import pytest
+
+from rssfetcher._utils import read_settings_env
+from rssfetcher.settings import Settings
+
+@pytest.mark.parametrize('env_name', ['RSSFETCHER_CONFIG', 'rssfetcher_config', 'RssFetcher_Config'])
+def test_read_settings_env_same_as_settings(monkeypatch, env_name):
+    for name in list(os.environ):
+        if name.lower().startswith('rssfetcher_'):
+            monkeypatch.delenv(name)
+    assert read_settings_env('config') is Settings().config is None
+
+    monkeypatch.setenv(env_name, 'config.yml')
+    assert read_settings_env('config') == Settings().config == 'config.yml'
@@ -5,7 +5,8 @@
 # 
 # ----------
 
-from rssfetcher.stores import open_store
+from rssfetcher.models import RssItemRowRecord
+from rssfetcher.stores import RssStore, SqliteRssStore, open_store
 
 def test_store():
     with open_store(":memory:") as store:
@@ -22,3 +23,115 @@ def test_store():
         assert len(items) == 2
         assert items[0]['title'] == 'Title 1'
         assert items[1]['title'] == 'Title 2'
+
+def test_store_read_items_by_feed_ids():
+    with open_store(":memory:") as store:
+        store.init_store()
+        store.upsert([
+            {'feed_id': f'feed{i % 3}', 'rss_id': f'rss{i}', 'title': f'Title {i}', 'raw': f'<item>Content {i}</item>'}
+            for i in range(9)
+        ])
+
+        items = store.read_items(0, 10, feed_ids=['feed1'])
+        assert [x['rss_id'] for x in items] == ['rss1', 'rss4', 'rss7']
+
+        items = store.read_items(items[0]['rowid'], 10, feed_ids=['feed1', 'feed2'])
+        assert [x['rss_id'] for x in items] == ['rss2', 'rss4', 'rss5', 'rss7', 'rss8']
+
+        assert store.read_items(0, 10, feed_ids=['feed3']) == []
+        assert len(store.read_items(0, 10, feed_ids=[])) == 9
+
+def test_store_init_store_creates_feed_id_index():
+    with open_store(":memory:") as store:
+        store.init_store()
+        store.init_store()
+        plan = store._cur.execute(
+            'EXPLAIN QUERY PLAN SELECT ROWID, * FROM rss WHERE feed_id = ? AND ROWID > 0 ORDER BY ROWID',
+            ('feed1', )
+        ).fetchall()
+        assert 'rss_feed_id_rowid' in str([tuple(x) for x in plan])
+        assert 'TEMP B-TREE' not in str([tuple(x) for x in plan])
+
+def test_store_upsert_records():
+    assert RssItemRowRecord._fields == (*RssStore.COLUMN_NAMES, SqliteRssStore.COLUMN_NAME_HASH)
+
+    with open_store(":memory:") as store:
+        store.init_store()
+        store.upsert(RssItemRowRecord('feed1', f'rss{i}', f'Title {i}', f'<item>Content {i}</item>') for i in range(3))
+        store.upsert([RssItemRowRecord('feed1', 'rss0', 'Title 0', '<item>Content 0</item>')])
+
+        assert store.get_count() == 3
+        assert [x['rss_id'] for x in store.read_items(0, 10)] == ['rss0', 'rss1', 'rss2']
+
+def test_store_upsert_updated_items():
+    with open_store(":memory:") as store:
+        store.init_store()
+        assert store.upsert([
+            RssItemRowRecord('feed1', 'rss1', 'Title 1', '<item>Content 1</item>'),
+            RssItemRowRecord('feed1', 'rss2', 'Title 2', '<item>Content 2</item>'),
+        ]) == 2
+
+        # unchanged items are not written:
+        assert store.upsert([RssItemRowRecord('feed1', 'rss1', 'Title 1', '<item>Content 1</item>')]) == 0
+        assert [x['rowid'] for x in store.read_items(0, 10)] == [1, 2]
+
+        # updated items get a new rowid:
+        assert store.upsert([
+            RssItemRowRecord('feed1', 'rss1', 'Title 1 (edited)', '<item>Content 1 (edited)</item>'),
+            RssItemRowRecord('feed1', 'rss2', 'Title 2', '<item>Content 2</item>'),
+        ]) == 1
+        assert store.get_count() == 2
+        items = store.read_items(2, 10)
+        assert [(x['rowid'], x['rss_id'], x['title']) for x in items] == [(3, 'rss1', 'Title 1 (edited)')]
+
+def test_store_init_store_migrates_hash_column():
+    with open_store(":memory:") as store:
+        store._cur.execute('CREATE TABLE rss (feed_id TEXT NOT NULL, rss_id TEXT NOT NULL, title TEXT, raw TEXT, '
+                           'PRIMARY KEY (feed_id, rss_id))')
+        store._cur.execute("INSERT INTO rss VALUES ('feed1', 'rss1', 'Title 1', '<item>Content 1</item>')")
+        store.init_store()
+
+        # the existing rows are not seen as updated:
+        assert store.upsert([RssItemRowRecord('feed1', 'rss1', 'Title 1', '<item>Content 1</item>')]) == 0
+        assert store.upsert([RssItemRowRecord('feed1', 'rss1', 'Title 1', '<item>Content 2</item>')]) == 1
+
+def test_store_upsert_duplicated_keys():
+    with open_store(":memory:") as store:
+        store.init_store()
+        items = [
+            RssItemRowRecord('feed1', 'rss1', 'Title 1', '<item>Content 1</item>'),
+            RssItemRowRecord('feed1', 'rss1', 'Title 1', '<item>Content 1 (duplicated)</item>'),
+        ]
+        assert store.upsert(items) == 1
+        # the duplicated items are not seen as updated on the next upsert:
+        assert store.upsert(items) == 0
+        assert store.upsert(items) == 0
+
+        items = store.read_items(0, 10)
+        assert [(x['rowid'], x['raw']) for x in items] == [(1, '<item>Content 1</item>')]
+
+def test_store_savepoint():
+    with open_store(":memory:") as store:
+        store.init_store()
+        store.commit()
+        with store.savepoint('sp'):
+            store.upsert([RssItemRowRecord('feed1', 'rss1', 'Title 1', '<item>Content 1</item>')])
+        try:
+            with store.savepoint('sp'):
+                store.upsert([RssItemRowRecord('feed1', 'rss2', 'Title 2', '<item>Content 2</item>')])
+                raise ValueError
+        except ValueError:
+            pass
+        # the released savepoint is not committed yet:
+        assert store._conn.in_transaction
+        store.commit()
+        assert [x['rss_id'] for x in store.read_items(0, 10)] == ['rss1']
+
+def test_store_upsert_use_hash_of_record():
+    with open_store(":memory:") as store:
+        store.init_store()
+        raw = '<item>Content 1</item>'
+        assert store.upsert([RssItemRowRecord('feed1', 'rss1', 'Title 1', raw, store._compute_hash(raw))]) == 1
+        # the same hash as computed by the store:
+        assert store.upsert([RssItemRowRecord('feed1', 'rss1', 'Title 1', raw)]) == 0
+        assert store.upsert([{'feed_id': 'feed1', 'rss_id': 'rss1', 'title': 'Title 1', 'raw': raw}]) == 0
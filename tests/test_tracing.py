@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2025~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import io
+import json
+
+import pytest
+
+from rssfetcher.tracing import Tracer, accumulate, get_tracer, set_tracer, span
+
+def test_span_without_tracer_is_noop():
+    assert get_tracer() is None
+    with span('noop'):
+        pass
+
+def test_tracer_export(tmp_path):
+    tracer = Tracer()
+    set_tracer(tracer)
+    try:
+        with span('outer', feed_id='feed1'):
+            with span('inner'):
+                pass
+    finally:
+        set_tracer(None)
+
+    path = tmp_path / 'trace.json'
+    tracer.export(str(path))
+    events = json.loads(path.read_text(encoding='utf8'))['traceEvents']
+    assert [x['name'] for x in events] == ['inner', 'outer']
+    assert events[1]['args'] == {'feed_id': 'feed1'}
+    assert events[1]['dur'] >= events[0]['dur']
+
+def test_tracer_accumulate():
+    with accumulate('noop') as stages:
+        with stages['noop']:
+            pass
+
+    tracer = Tracer(profile=True)
+    set_tracer(tracer)
+    try:
+        with span('outer'):
+            with accumulate('a', 'b', 'c', feed_id='feed1') as stages:
+                for _ in range(100):
+                    with stages['a']:
+                        pass
+                    with stages['b']:
+                        pass
+    finally:
+        set_tracer(None)
+
+    events = tracer.get_events()
+    # one event for each stage, not one for each item:
+    assert [x['name'] for x in events] == ['a', 'b', 'outer']
+    assert events[0]['args'] == {'feed_id': 'feed1', 'count': 100}
+    assert events[0]['ts'] + events[0]['dur'] == pytest.approx(events[1]['ts'])
+    # the accumulated stages are not profiled separately:
+    assert list(tracer._profiles or ()) == ['outer']
+
+def test_tracer_profile():
+    tracer = Tracer(profile=True)
+    with tracer.span('outer'):
+        with tracer.span('inner'):
+            sorted(range(1000))
+    sb = io.StringIO()
+    tracer.print_profile_stats(file=sb)
+    assert 'stage: outer' in sb.getvalue()
+    assert 'stage: inner' in sb.getvalue()